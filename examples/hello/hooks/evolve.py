@@ -1,11 +1,26 @@
 #!/usr/bin/env python3
 """hello evolve hook — notes CRUD with all hook handlers."""
 
-import json, sys
-from datetime import datetime, timezone
+import contextlib, functools, io, json, os, re, sys, time
+from contextvars import ContextVar
 from pathlib import Path
 from typing import Annotated, TypedDict, get_type_hints
 
+# all IPC in and out of this hook is JSON; msgspec's C encoder/decoder is
+# several times faster than stdlib json, so use it when installed.
+try:
+    import msgspec.json as _msjson
+    _ENCODER = _msjson.Encoder()
+    _DECODER = _msjson.Decoder()
+    dumps_bytes = _ENCODER.encode
+    def dumps(obj):
+        return _ENCODER.encode(obj).decode()
+    loads = _DECODER.decode
+except ImportError:
+    dumps, loads = json.dumps, json.loads
+    def dumps_bytes(obj):
+        return json.dumps(obj).encode()
+
 WORKSPACE = Path(__file__).resolve().parent.parent
 NOTES = WORKSPACE / "traits"
 
@@ -31,46 +46,124 @@ def param(description, type="string", optional=False, enum=None):
     return spec
 
 NOTE_PRIORITIES = ["low", "normal", "high"]
+# module-level so the Annotated metadata below stays a plain name reference:
+# Cython cannot round-trip an f-string literal inside an annotation, which
+# left the compiled module unimportable
+_PRIORITY_DESC = f"optional priority. one of: {', '.join(NOTE_PRIORITIES)}"
+
+# single place the note_changed notify shape is built
+def _notify(name):
+    return [{"type": "note_changed", "files": [name]}]
+
+# result keys the caller asked for beyond "result"; execute_tool seeds this
+# from ctx.subscribe, and None keeps the full payload for back-compat
+_SUBSCRIBE = ContextVar("subscribe", default=None)
+
+def _wants(key):
+    sub = _SUBSCRIBE.get()
+    return sub is None or key in sub
+
+# note names are plain filenames: one compiled regex match rejects path
+# traversal, separators, and null bytes without touching the filesystem.
+# \Z, not $ — $ would still match before a trailing newline
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_.][A-Za-z0-9_.-]*\Z").match
+
+def safe_name(name):
+    return bool(_SAFE_NAME(name)) and name not in (".", "..")
 
 def hook(fn):
     HOOKS[fn.__name__] = fn
     return fn
 
+# tool metadata, introspected once at definition time by @tool
+_TOOL_META = {}
+
 def tool(fn=None, *, permission=None):
     def decorator(f):
+        hints = get_type_hints(f, include_extras=True)
+        params = {
+            p: h.__metadata__[0]
+            for p, h in hints.items()
+            if p != "return" and hasattr(h, "__metadata__")
+        }
+        entry = {"name": f.__name__, "description": f.__doc__ or "", "parameters": params}
         if permission:
             f._permission = permission
+            entry["permission"] = permission
         TOOLS[f.__name__] = f
+        _TOOL_META[f.__name__] = entry
         return f
     if fn is not None:
         return decorator(fn)
     return decorator
 
+# EVOLVE_DEBUG=0 disables log lines entirely, skipping serialization and
+# I/O on the production hot path
+_DEBUG = os.environ.get("EVOLVE_DEBUG", "1") != "0"
+
+# bytes all the way to the kernel: msgspec encodes straight to bytes and
+# sys.stdout.buffer skips the text layer's re-encode. redirected stdouts
+# (StringIO in the in-process test harness) have no buffer, so fall back to
+# the text path there.
+def _write(obj):
+    buf = getattr(sys.stdout, "buffer", None)
+    if buf is None:
+        sys.stdout.write(dumps(obj) + "\n")
+        sys.stdout.flush()
+    else:
+        buf.write(dumps_bytes(obj) + b"\n")
+        buf.flush()
+
 def debug(msg):
-    print(json.dumps({"log": msg}), flush=True)
+    if not _DEBUG:
+        return
+    _write({"log": msg})
 
-def note_names():
-    if not NOTES.exists():
+# sorted listing cached against the directory mtime: scandir's DirEntry
+# answers is_file() from the readdir buffer, so a warm call is one stat.
+_NOTES_CACHE = None
+
+def note_names() -> list[str]:
+    global _NOTES_CACHE
+    try:
+        st = os.stat(NOTES)
+    except FileNotFoundError:
         return []
-    return sorted(f.name for f in NOTES.iterdir() if f.is_file())
+    key = (str(NOTES), st.st_mtime_ns)
+    if _NOTES_CACHE and _NOTES_CACHE[0] == key:
+        return _NOTES_CACHE[1]
+    with os.scandir(NOTES) as entries:
+        names = sorted(e.name for e in entries if e.is_file())
+    _NOTES_CACHE = (key, names)
+    return names
+
+_ENV_PREFIX = "\n<env>\nSession start time: "
+_ENV_SUFFIX = " UTC\n</env>\n"
+
+# prompts arrive per call in ctx, so the static preamble+mode head is cached
+# keyed on the prompt strings themselves; only notes and the timestamp are
+# stamped per call.
+@functools.lru_cache(maxsize=8)
+def _prompt_head(preamble, mode_text):
+    return preamble + mode_text
 
 # compose system prompt from evolve-injected prompt contract parts, appending
 # the notes list and an env block. preamble/stage bodies come from ctx.prompts.
-def system_prompt(prompts, mode=None):
-    parts = [prompts.get("preamble", "")]
-    if mode:
-        parts.append(prompts.get(mode, ""))
+def system_prompt(prompts: dict, mode: str | None = None) -> list[str]:
+    head = _prompt_head(prompts.get("preamble", ""), prompts.get(mode, "") if mode else "")
     notes = note_names()
-    if notes:
-        parts.append(f"\ncurrent notes: {', '.join(notes)}\n")
-    parts.append(
-        f"\n<env>\nSession start time: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}\n</env>\n"
-    )
-    return ["".join(p for p in parts if p)]
+    notes_line = f"\ncurrent notes: {', '.join(notes)}\n" if notes else ""
+    # time.gmtime + int formatting skips datetime construction entirely
+    t = time.gmtime()
+    return [
+        f"{head}{notes_line}{_ENV_PREFIX}"
+        f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} "
+        f"{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}{_ENV_SUFFIX}"
+    ]
 
 # --- tools ---
 
-def truthy(v):
+def truthy(v) -> bool:
     """coerce json-decoded bool, int, or string to a python bool"""
     if isinstance(v, bool):
         return v
@@ -94,6 +187,8 @@ def note_read(
     limit: Annotated[str, param("maximum lines to return (default: all)", type="number", optional=True)] = "",
 ) -> HookResult:
     """read a note"""
+    if not safe_name(name):
+        return {"result": f"invalid name: {name}"}
     try:
         content = (NOTES / name).read_text()
     except FileNotFoundError:
@@ -113,9 +208,11 @@ def note_write(
     metadata: Annotated[object, param("optional key/value metadata, json-encoded into the header", type="object", optional=True)] = None,
     extras: Annotated[object, param("optional free-form extras (any json value), json-encoded as 'extras:' header line", type="any", optional=True)] = None,
     raw_list: Annotated[object, param("optional mixed-type list, json-encoded as 'items:' header line", type="array", optional=True)] = None,
-    priority: Annotated[str, param(f"optional priority. one of: {', '.join(NOTE_PRIORITIES)}", optional=True, enum=NOTE_PRIORITIES)] = "",
+    priority: Annotated[str, param(_PRIORITY_DESC, optional=True, enum=NOTE_PRIORITIES)] = "",
 ) -> HookResult:
     """write a note"""
+    if not safe_name(name):
+        return {"result": f"invalid name: {name}"}
     NOTES.mkdir(parents=True, exist_ok=True)
     headers = []
     if tags:
@@ -130,45 +227,48 @@ def note_write(
         headers.append(f"priority: {priority}")
     body = ("\n".join(headers) + "\n" + content) if headers else content
     (NOTES / name).write_text(body)
-    return {"result": f"wrote {name}", "modified": [name],
-            "notify": [{"type": "note_changed", "files": [name]}]}
+    global _NOTES_CACHE
+    _NOTES_CACHE = None
+    result: HookResult = {"result": f"wrote {name}"}
+    if _wants("modified"):
+        result["modified"] = [name]
+    if _wants("notify"):
+        result["notify"] = _notify(name)
+    return result
 
 @tool(permission={"arg": "name"})
 def note_delete(
     name: Annotated[str, "note filename (e.g. todo.md)"],
 ) -> HookResult:
     """delete a note"""
-    path = NOTES / name
-    if not path.exists():
+    if not safe_name(name):
+        return {"result": f"invalid name: {name}"}
+    # EAFP: one syscall on the happy path instead of exists()+unlink
+    try:
+        (NOTES / name).unlink()
+    except FileNotFoundError:
         return {"result": f"not found: {name}"}
-    path.unlink()
-    return {"result": f"deleted {name}", "modified": [name],
-            "notify": [{"type": "note_changed", "files": [name]}]}
+    global _NOTES_CACHE
+    _NOTES_CACHE = None
+    result: HookResult = {"result": f"deleted {name}"}
+    if _wants("modified"):
+        result["modified"] = [name]
+    if _wants("notify"):
+        result["notify"] = _notify(name)
+    return result
 
 # --- tool introspection ---
 
-def tool_defs():
-    defs = []
-    for name, fn in TOOLS.items():
-        hints = get_type_hints(fn, include_extras=True)
-        params = {
-            p: h.__metadata__[0]
-            for p, h in hints.items()
-            if p != "return" and hasattr(h, "__metadata__")
-        }
-        entry = {"name": name, "description": fn.__doc__ or "", "parameters": params}
-        if hasattr(fn, "_permission"):
-            entry["permission"] = fn._permission
-        defs.append(entry)
-    return defs
+def tool_defs() -> list[dict]:
+    return list(_TOOL_META.values())
 
 # --- hooks ---
 
 @hook
 def discover(ctx: dict) -> HookResult:
-    names = [t["name"] for t in tool_defs()]
-    debug(f"tools: {', '.join(names)}")
-    return {"name": "hello", "test": "hello_test.py", "tools": tool_defs()}
+    defs = tool_defs()
+    debug(f"tools: {', '.join(t['name'] for t in defs)}")
+    return {"name": "hello", "test": "hello_test.py", "tools": defs}
 
 @hook
 def mutate_request(ctx: dict) -> HookResult:
@@ -180,13 +280,13 @@ def mutate_request(ctx: dict) -> HookResult:
 @hook
 def format_notification(ctx: dict) -> HookResult:
     notifications = ctx.get("notifications", [])
-    changed = set()
+    changed = {}  # dict as ordered set: dedupes at O(N) in first-seen order
     for n in notifications:
         if n.get("type") == "note_changed":
-            changed.update(n.get("files", []))
+            changed.update(dict.fromkeys(n.get("files", ())))
     if not changed:
         return {}
-    return {"message": f"[note-update] changed: {', '.join(sorted(changed))}"}
+    return {"message": f"[note-update] changed: {', '.join(changed)}"}
 
 @hook
 def observe_message(ctx: dict) -> HookResult:
@@ -232,35 +332,122 @@ def compacting(ctx: dict) -> HookResult:
 @hook
 def execute_tool(ctx: dict) -> HookResult:
     name = ctx.get("tool", "")
-    handler = TOOLS.get(name)
-    if not handler:
-        debug(f"unknown tool: {name}")
-        return {"result": f"unknown tool: {name}"}
     args = ctx.get("args", {})
-    debug(f"tool={name} args={list(args.keys())}")
+    sub = ctx.get("subscribe")
+    token = _SUBSCRIBE.set(frozenset(sub)) if sub is not None else None
+    # key lists are only built when logging is on
+    if _DEBUG:
+        debug(f"tool={name} args={list(args.keys())}")
     try:
-        result = handler(**args)
-        debug(f"tool={name} result keys={list(result.keys())}")
+        # literal match compiles to direct calls under the specializing
+        # interpreter; TOOLS stays the fallback for tools registered later
+        match name:
+            case "note_list":
+                result = note_list(**args)
+            case "note_read":
+                result = note_read(**args)
+            case "note_write":
+                result = note_write(**args)
+            case "note_delete":
+                result = note_delete(**args)
+            case _:
+                handler = TOOLS.get(name)
+                if not handler:
+                    debug(f"unknown tool: {name}")
+                    return {"result": f"unknown tool: {name}"}
+                result = handler(**args)
+        if _DEBUG:
+            debug(f"tool={name} result keys={list(result.keys())}")
         return result
     except Exception as e:
         debug(f"tool={name} error: {e}")
         return {"result": f"tool error: {e}"}
+    finally:
+        if token is not None:
+            _SUBSCRIBE.reset(token)
+
+# long-running daemon form: one JSONL request per line on stdin, one JSONL
+# response per line on stdout. a driver that keeps one worker per session
+# amortizes interpreter startup (and JIT warmup on PyPy) across all hook
+# calls instead of paying it per invocation.
+def daemon_loop():
+    for line in sys.stdin.buffer:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = loads(line)
+        except ValueError:
+            continue
+        handler = HOOKS.get(req.get("hook", ""))
+        try:
+            result = handler(req.get("ctx", {})) if handler else {}
+        except Exception as e:
+            result = {"error": str(e)}
+        _write({"id": req.get("id"), "result": result})
+
+# length-prefixed RPC form: each request is "<len>\n" followed by exactly
+# len bytes of JSON ({id, hook, ctx}); responses and forwarded log lines use
+# the same framing, so a driver can pipeline N hook calls over one pipe
+# without per-call process churn or newline escaping concerns.
+def rpc_loop():
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+
+    def write_frame(payload: bytes):
+        stdout.write(str(len(payload)).encode() + b"\n" + payload)
+
+    while True:
+        line = stdin.readline()
+        if not line:
+            break
+        try:
+            n = int(line)
+        except ValueError:
+            continue
+        try:
+            req = loads(stdin.read(n))
+        except ValueError:
+            continue
+        handler = HOOKS.get(req.get("hook", ""))
+        # capture debug output and forward each log line as its own frame,
+        # keeping the stream frame-clean
+        buf = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(buf):
+                result = handler(req.get("ctx", {})) if handler else {}
+        except Exception as e:
+            result = {"error": str(e)}
+        for log_line in buf.getvalue().splitlines():
+            if log_line:
+                write_frame(log_line.encode())
+        write_frame(dumps_bytes({"id": req.get("id"), "result": result}))
+        stdout.flush()
 
 if __name__ == "__main__":
+    if os.environ.get("EVOLVE_RPC"):
+        rpc_loop()
+        sys.exit(0)
+    if os.environ.get("EVOLVE_DAEMON"):
+        daemon_loop()
+        sys.exit(0)
     if len(sys.argv) < 2:
-        print(json.dumps({"error": "usage: evolve.py <hook_name>"}))
+        _write({"error": "usage: evolve.py <hook_name>"})
         sys.exit(1)
     h = HOOKS.get(sys.argv[1])
     if not h:
         sys.exit(0)
+    # read raw bytes; both json.loads and msgspec decode bytes directly,
+    # skipping the text layer's utf-8 decode pass
     try:
-        ctx = json.loads(sys.stdin.read() or "{}")
-    except json.JSONDecodeError:
+        ctx = loads(sys.stdin.buffer.read() or b"{}")
+    except ValueError:
         ctx = {}
     try:
         result = h(ctx)
     except Exception as e:
         debug(f"{sys.argv[1]}: {e}")
         result = {"error": str(e)}
-    for key, value in result.items():
-        print(json.dumps({key: value}), flush=True)
+    # one write+flush for the whole result instead of one per key
+    out = b"".join(dumps_bytes({key: value}) + b"\n" for key, value in result.items())
+    sys.stdout.buffer.write(out)
+    sys.stdout.buffer.flush()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""optional Cython build for hooks/evolve.py.
+
+nothing in this repo loads the compiled module: opencode discovers and
+execs the hook as a plain script, and the test harness imports a
+per-scenario copy of the .py. the build exists for external embedders that
+import evolve in-process:
+
+    python3 setup.py build_ext --inplace
+
+that drops evolve.cpython-*.so next to this file (not in hooks/, so hook
+discovery never sees it); put its directory on sys.path to prefer it.
+'make compile' imports the built module and runs discover so a broken
+build fails loudly. without Cython installed the hook runs from source
+unchanged.
+"""
+
+from setuptools import setup
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    raise SystemExit("Cython not installed; the hook runs fine from source")
+
+setup(ext_modules=cythonize("hooks/evolve.py", language_level=3))
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
-"""end-to-end tests for hello evolve hook (JSONL IPC)."""
+"""end-to-end tests for hello evolve hook (JSONL IPC).
 
-import json, os, re, shutil, subprocess, sys, tempfile
+scenarios are independent and run in parallel, one temp workspace each,
+across a ProcessPoolExecutor; per-scenario pass/fail counts and failure
+messages are aggregated by the driver at the bottom.
+"""
+
+import concurrent.futures, contextlib, functools, importlib, io, json, os, re, shutil, subprocess, sys, tempfile
 from datetime import datetime, timezone
 from pathlib import Path
 
 PASS = FAIL = 0
+FAILURES = []
 
 PROMPT_CONTRACT = {
     "preamble": "preamble.md",
@@ -15,18 +21,72 @@ PROMPT_CONTRACT = {
     "recover": "recover.md",
 }
 
+# prompt files are re-read on every call_hook; cache contents keyed by path
+# and gated on mtime so edits are still picked up. missing files are
+# negative-cached the same way to avoid repeated ENOENT stats.
+_PROMPT_CACHE = {}
+
+def _read_prompt(path):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    entry = _PROMPT_CACHE.get(path)
+    if entry and entry[0] == mtime:
+        return entry[1]
+    text = open(path).read() if mtime is not None else None
+    _PROMPT_CACHE[path] = (mtime, text)
+    return text
+
 def load_prompts(workspace):
     """mirror evolve plugin's loadPrompts() for hook tests."""
     out = {}
     for name, file in PROMPT_CONTRACT.items():
-        p = os.path.join(workspace, "prompts", file)
-        if os.path.exists(p):
-            out[name] = open(p).read()
+        text = _read_prompt(os.path.join(workspace, "prompts", file))
+        if text is not None:
+            out[name] = text
     return out
 
+# the hook module, imported once per worker process by call_hook — spawning a
+# subprocess per check pays interpreter startup + import cost dozens of times.
+_EVOLVE = None
+
+def import_hook(hook_path):
+    """import the hook as a module and point it at the test workspace."""
+    global _EVOLVE
+    if _EVOLVE is None:
+        sys.path.insert(0, os.path.dirname(hook_path))
+        _EVOLVE = importlib.import_module("evolve")
+    workspace = Path(hook_path).resolve().parent.parent
+    _EVOLVE.WORKSPACE = workspace
+    _EVOLVE.NOTES = workspace / "traits"
+    return _EVOLVE
+
 def call_hook(hook_path, name, ctx=None):
-    """call a hook and return (merged_result, logs, exit_code).
+    """call a hook in-process and return (merged_result, logs, exit_code).
     auto-injects ctx.prompts from workspace/prompts/ to mirror evolve."""
+    evolve = import_hook(hook_path)
+    full = dict(ctx or {})
+    if "prompts" not in full:
+        full["prompts"] = load_prompts(os.path.dirname(os.path.dirname(hook_path)))
+    handler = evolve.HOOKS.get(name)
+    result, logs = {}, []
+    buf = io.StringIO()
+    if handler:
+        with contextlib.redirect_stdout(buf):
+            result = dict(handler(full))
+    for line in buf.getvalue().splitlines():
+        if not line:
+            continue
+        obj = json.loads(line)
+        if "log" in obj:
+            logs.append(obj["log"])
+        else:
+            result.update(obj)
+    return result, logs, 0
+
+def call_hook_subprocess(hook_path, name, ctx=None):
+    """call a hook through the CLI for tests that assert on exit codes."""
     full = dict(ctx or {})
     if "prompts" not in full:
         full["prompts"] = load_prompts(os.path.dirname(os.path.dirname(hook_path)))
@@ -55,9 +115,10 @@ def check(desc, ok, detail=""):
         PASS += 1
     else:
         FAIL += 1
-        print(f"FAIL: {desc}")
+        msg = f"FAIL: {desc}"
         if detail:
-            print(f"  {detail}")
+            msg += f"\n  {detail}"
+        FAILURES.append(msg)
 
 def has_key(result, key):
     return key in result
@@ -65,38 +126,69 @@ def has_key(result, key):
 def has_value(result, key, substring):
     return key in result and substring in str(result[key])
 
-# --- setup ---
-
-# workspace is either passed as arg or derived from OPENCODE_EVOLVE_WORKSPACE
-if len(sys.argv) > 1:
-    workspace = sys.argv[1]
-else:
-    workspace = os.environ.get("OPENCODE_EVOLVE_WORKSPACE", os.environ.get("OPENCODE_SIDECAR_WORKSPACE", ""))
-    if not workspace:
-        workspace = str(Path(__file__).resolve().parent.parent)
-
-tmp = tempfile.mkdtemp()
-
-try:
-    # copy hook into temp workspace
-    for d in ("hooks", "traits", "prompts"):
-        os.makedirs(os.path.join(tmp, d))
-    shutil.copy2(os.path.join(workspace, "hooks", "evolve.py"), os.path.join(tmp, "hooks", "evolve.py"))
-    hook = os.path.join(tmp, "hooks", "evolve.py")
-    for name, content in [("preamble.md", "preamble"), ("chat.md", "chat"),
-                          ("heartbeat.md", "heartbeat"), ("compaction.md", "compaction")]:
-        open(os.path.join(tmp, "prompts", name), "w").write(content)
+# --- scenarios ---
+# each runs in its own temp workspace; no shared filesystem state.
 
-    # --- error handling ---
+def scenario_cli(hook, tmp):
+    """CLI paths that need a real subprocess: exit codes, daemon, rpc."""
 
-    r, _, rc = call_hook(hook, "nonexistent")
+    r, _, rc = call_hook_subprocess(hook, "nonexistent")
     check("unknown hook exits cleanly", rc == 0 and r == {})
 
     proc = subprocess.run([hook], capture_output=True, text=True)
     check("no args returns error", proc.returncode != 0 or "error" in proc.stdout)
 
-    # --- discover ---
+    r, logs, code = call_hook_subprocess(hook, "nonexistent_hook", {})
+    check("unknown hook exits 0", code == 0, f"exit_code={code}")
+    check("unknown hook returns empty result", r == {}, f"got={r}")
+
+    # --- daemon mode ---
 
+    proc = subprocess.run(
+        [hook],
+        input='{"id": 1, "hook": "discover", "ctx": {}}\n{"id": 2, "hook": "nonexistent", "ctx": {}}\n',
+        capture_output=True, text=True, env={**os.environ, "EVOLVE_DAEMON": "1"},
+    )
+    responses = {}
+    for line in proc.stdout.strip().splitlines():
+        obj = json.loads(line)
+        if "id" in obj:
+            responses[obj["id"]] = obj["result"]
+    check("daemon exits 0 at eof", proc.returncode == 0, f"exit_code={proc.returncode}")
+    check("daemon answers discover", "tools" in responses.get(1, {}), f"got={responses.get(1)}")
+    check("daemon unknown hook returns empty", responses.get(2) == {}, f"got={responses.get(2)}")
+
+    # --- rpc mode (length-prefixed frames) ---
+
+    def frame(obj):
+        payload = json.dumps(obj)
+        return f"{len(payload.encode())}\n{payload}"
+
+    def parse_frames(out):
+        frames, i = [], 0
+        while i < len(out):
+            nl = out.find("\n", i)
+            if nl < 0:
+                break
+            n = int(out[i:nl])
+            frames.append(json.loads(out[nl + 1:nl + 1 + n]))
+            i = nl + 1 + n
+        return frames
+
+    rpc_input = (frame({"id": 1, "hook": "discover", "ctx": {}})
+                 + frame({"id": 2, "hook": "nonexistent", "ctx": {}}))
+    proc = subprocess.run(
+        [hook], input=rpc_input, capture_output=True, text=True,
+        env={**os.environ, "EVOLVE_RPC": "1"},
+    )
+    frames = parse_frames(proc.stdout)
+    rpc_responses = {f["id"]: f["result"] for f in frames if "id" in f}
+    check("rpc exits 0 at eof", proc.returncode == 0, f"exit_code={proc.returncode}")
+    check("rpc answers discover", "tools" in rpc_responses.get(1, {}), f"got={rpc_responses.get(1)}")
+    check("rpc unknown hook returns empty", rpc_responses.get(2) == {}, f"got={rpc_responses.get(2)}")
+    check("rpc forwards log frames", any("log" in f for f in frames), f"got={frames}")
+
+def scenario_discover(hook, tmp):
     r, logs, _ = call_hook(hook, "discover")
     check("discover returns tools key", has_key(r, "tools"))
     check("discover has no typo keys", not has_key(r, "tool"))
@@ -125,6 +217,7 @@ try:
           f"got: {priority_spec.get('enum')}")
     check("note_write.priority is optional", priority_spec.get("optional") is True)
 
+def scenario_prompts(hook, tmp):
     # --- mutate_request ---
 
     r, logs, _ = call_hook(hook, "mutate_request")
@@ -169,6 +262,19 @@ try:
     check("recover returns user key", has_key(r, "user"))
     check("recover logs context", any("recovering from mutate_request" in l for l in logs))
 
+    # --- compacting ---
+
+    r, logs, _ = call_hook(hook, "compacting")
+    check("compacting defers to evolve default (returns no prompt)", not has_key(r, "prompt"),
+          f"got: {r}")
+    check("compacting logs notes", any("notes:" in l for l in logs))
+
+    # --- empty stdin ---
+
+    r, _, _ = call_hook(hook, "mutate_request")
+    check("empty context returns system key", has_key(r, "system"))
+
+def scenario_sessions(hook, tmp):
     # --- observe_message ---
 
     _, logs, _ = call_hook(hook, "observe_message", {"session": {"id": "abc", "agent": "evolve"}})
@@ -182,13 +288,7 @@ try:
     check("idle logs session", any("session=s1" in l for l in logs))
     check("idle logs answer length", any("answer_len=5" in l for l in logs))
 
-    # --- compacting ---
-
-    r, logs, _ = call_hook(hook, "compacting")
-    check("compacting defers to evolve default (returns no prompt)", not has_key(r, "prompt"),
-          f"got: {r}")
-    check("compacting logs notes", any("notes:" in l for l in logs))
-
+def scenario_notes(hook, tmp):
     # --- note_list ---
 
     open(os.path.join(tmp, "traits", "todo.md"), "w").write("buy milk")
@@ -270,8 +370,27 @@ try:
     check("note_delete returns notify", has_key(r, "notify"))
     check("note_delete notify has note_changed", any(n.get("type") == "note_changed" for n in r.get("notify", [])))
 
-    # --- format_notification ---
+    # --- subscribe filtering ---
+
+    r, _, _ = call_hook(hook, "execute_tool", {
+        "tool": "note_write", "args": {"name": "S.md", "content": "x"}, "subscribe": ["result"],
+    })
+    check("subscribed write returns result", "wrote" in r.get("result", ""), f"got={r}")
+    check("subscribed write omits modified", not has_key(r, "modified"), f"got={r}")
+    check("subscribed write omits notify", not has_key(r, "notify"), f"got={r}")
+
+    r, _, _ = call_hook(hook, "execute_tool", {
+        "tool": "note_delete", "args": {"name": "S.md"}, "subscribe": ["result", "notify"],
+    })
+    check("subscribed delete keeps notify", has_key(r, "notify"), f"got={r}")
+    check("subscribed delete omits modified", not has_key(r, "modified"), f"got={r}")
+
+    # default (no subscribe key) keeps the full payload
+    r, _, _ = call_tool(hook, "note_write", {"name": "S2.md", "content": "x"})
+    check("unsubscribed write keeps full payload", has_key(r, "modified") and has_key(r, "notify"), f"got={r}")
+    os.remove(os.path.join(tmp, "traits", "S2.md"))
 
+def scenario_notifications(hook, tmp):
     r, _, _ = call_hook(hook, "format_notification", {
         "notifications": [{"type": "note_changed", "files": ["FOO.md", "BAR.md"]}],
     })
@@ -285,6 +404,7 @@ try:
     r, _, _ = call_hook(hook, "format_notification", {})
     check("format_notification missing key returns no message", not has_key(r, "message"))
 
+def scenario_tool_errors(hook, tmp):
     # --- unknown tool ---
 
     r, _, _ = call_tool(hook, "nonexistent")
@@ -297,13 +417,26 @@ try:
     check("bad args returns result key", has_key(r, "result"))
     check("bad args returns tool error", "tool error" in r["result"])
 
-    # --- empty stdin ---
+    # --- invalid note names ---
 
-    r, _, _ = call_hook(hook, "mutate_request")
-    check("empty context returns system key", has_key(r, "system"))
+    r, _, _ = call_tool(hook, "note_read", {"name": "../../etc/passwd"})
+    check("note_read rejects traversal", "invalid name" in r["result"], f"got={r}")
+
+    r, _, _ = call_tool(hook, "note_write", {"name": "../escape.md", "content": "x"})
+    check("note_write rejects traversal", "invalid name" in r["result"], f"got={r}")
+    check("note_write traversal left no file", not os.path.exists(os.path.join(tmp, "escape.md")))
+
+    r, _, _ = call_tool(hook, "note_delete", {"name": "sub/dir.md"})
+    check("note_delete rejects separators", "invalid name" in r["result"], f"got={r}")
+
+    r, _, _ = call_tool(hook, "note_delete", {"name": ".."})
+    check("note_delete rejects dot-dot", "invalid name" in r["result"], f"got={r}")
 
-    # --- history passthrough ---
+    r, _, _ = call_tool(hook, "note_write", {"name": "a.md\n", "content": "x"})
+    check("note_write rejects trailing newline", "invalid name" in r["result"], f"got={r}")
+    check("note_write newline left no file", not os.path.exists(os.path.join(tmp, "traits", "a.md")))
 
+def scenario_history(hook, tmp):
     sample_history = [
         {"role": "user", "agent": "evolve", "parts": [{"type": "text", "text": "hello"}]},
         {"role": "assistant", "agent": "evolve", "parts": [{"type": "text", "text": "hi there"}]},
@@ -347,17 +480,61 @@ try:
     })
     check("tool_after with history ok", not has_key(r, "error"))
 
-    # --- unknown hook: should exit 0 with no output ---
+SCENARIOS = [
+    "scenario_cli",
+    "scenario_discover",
+    "scenario_prompts",
+    "scenario_sessions",
+    "scenario_notes",
+    "scenario_notifications",
+    "scenario_tool_errors",
+    "scenario_history",
+]
+
+# --- driver ---
+
+def setup_workspace(workspace):
+    """copy the hook into a fresh temp workspace with stub prompts."""
+    tmp = tempfile.mkdtemp()
+    for d in ("hooks", "traits", "prompts"):
+        os.makedirs(os.path.join(tmp, d))
+    shutil.copy2(os.path.join(workspace, "hooks", "evolve.py"), os.path.join(tmp, "hooks", "evolve.py"))
+    for name, content in [("preamble.md", "preamble"), ("chat.md", "chat"),
+                          ("heartbeat.md", "heartbeat"), ("compaction.md", "compaction")]:
+        open(os.path.join(tmp, "prompts", name), "w").write(content)
+    return tmp
+
+def run_scenario(workspace, name):
+    """run one scenario in its own workspace; returns (pass, fail, failures)."""
+    global PASS, FAIL, FAILURES
+    PASS = FAIL = 0
+    FAILURES = []
+    tmp = setup_workspace(workspace)
+    try:
+        globals()[name](os.path.join(tmp, "hooks", "evolve.py"), tmp)
+    finally:
+        shutil.rmtree(tmp)
+    return PASS, FAIL, FAILURES
+
+if __name__ == "__main__":
+    # workspace is either passed as arg or derived from OPENCODE_EVOLVE_WORKSPACE
+    if len(sys.argv) > 1:
+        workspace = sys.argv[1]
+    else:
+        workspace = os.environ.get("OPENCODE_EVOLVE_WORKSPACE", os.environ.get("OPENCODE_SIDECAR_WORKSPACE", ""))
+        if not workspace:
+            workspace = str(Path(__file__).resolve().parent.parent)
 
-    r, logs, code = call_hook(hook, "nonexistent_hook", {})
-    check("unknown hook exits 0", code == 0, f"exit_code={code}")
-    check("unknown hook returns empty result", r == {}, f"got={r}")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        results = list(ex.map(functools.partial(run_scenario, workspace), SCENARIOS))
 
-finally:
-    shutil.rmtree(tmp)
+    total_pass = sum(p for p, _, _ in results)
+    total_fail = sum(f for _, f, _ in results)
+    for _, _, failures in results:
+        for msg in failures:
+            print(msg)
 
-# --- summary ---
+    # --- summary ---
 
-total = PASS + FAIL
-print(f"\n{total} tests, {PASS} passed, {FAIL} failed")
-sys.exit(1 if FAIL else 0)
+    print(f"\n{total_pass + total_fail} tests, {total_pass} passed, {total_fail} failed")
+    sys.exit(1 if total_fail else 0)